@@ -31,6 +31,7 @@ from __future__ import (
     with_statement,
 )
 
+import functools
 import glob
 import importlib
 import logging
@@ -40,9 +41,14 @@ import platform
 import shutil
 import subprocess
 import sys
+import time
 import uuid
 import zipfile
 
+from pyppyn import lock, plan
+from pyppyn.pool import WheelBuilderPool, set_resource_limits  # noqa: F401
+from pyppyn.requirement import installed_version, split_requirement
+
 __version__ = "0.5.14"
 
 __EXITOKAY__ = 0
@@ -54,6 +60,61 @@ logging.config.fileConfig(
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
+def _limits_preexec(cpu_limit=None, memory_limit=None):
+    """Return a preexec_fn applying resource limits, or None."""
+    if os.name != "posix" or (cpu_limit is None and memory_limit is None):
+        return None
+
+    return functools.partial(
+        set_resource_limits, cpu_limit=cpu_limit, memory_limit=memory_limit
+    )
+
+
+def _parse_entry_points(text):
+    """Parse entry_points.txt into a dict of groups of name: target."""
+    entry_points = {}
+    group = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+
+        if line.startswith("[") and line.endswith("]"):
+            group = line[1:-1].strip()
+            entry_points.setdefault(group, {})
+        elif group is not None and "=" in line:
+            name, target = line.split("=", 1)
+            entry_points[group][name.strip()] = target.strip()
+
+    return entry_points
+
+
+def _module_name(path):
+    """Return the dotted module name of a file in a wheel, or None."""
+    parts = path.split("/")
+
+    # files installed from <name>.data/purelib or platlib
+    if len(parts) > 2 and parts[0].endswith(".data"):
+        if parts[1] not in ("purelib", "platlib"):
+            return None
+        parts = parts[2:]
+
+    if parts[0].endswith(".dist-info"):
+        return None
+
+    base, ext = os.path.splitext(parts[-1])
+    if ext not in (".py", ".pyc", ".so", ".pyd"):
+        return None
+
+    # drop ABI tags, e.g. _ext.cpython-311-x86_64-linux-gnu
+    parts[-1] = base.split(".")[0]
+    parts = [part for part in parts if part != "__pycache__"]
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+
+    return ".".join(parts) or None
+
+
 class ConfigRep:
     """Utility for reading setup.cfg and installing dependencies.
 
@@ -73,6 +134,30 @@ class ConfigRep:
         python_version: A float with the major and minor versions of
             the currently running python.
         reqs: A list of packages required for the given package.
+        cache_dir: A str of the directory where Pyppyn keeps data
+            between runs, such as install timing history.
+        wheelhouse: A list of directories searched for wheels when
+            planning an install, or None for pip's wheel cache.
+        build_pool: A WheelBuilderPool used to build the wheel in a
+            warm worker, or None to start a new process.
+        lock_file: A str of the file recording the last installed
+            requirements, or None to keep one per environment in
+            cache_dir.
+        build_timeout: A number of seconds the wheel build may take,
+            or None for no limit.
+        install_timeout: A number of seconds each pip attempt may
+            take, or None for no limit.
+        install_retries: An int of times to retry a failed install.
+        retry_backoff: A number of seconds before the first retry,
+            doubled for each retry after.
+        cpu_limit: A number of CPU seconds the wheel build and each
+            pip run may use, or None to use build_pool's limit for
+            the build. POSIX only.
+        memory_limit: An int of bytes of address space the wheel
+            build and each pip run may use, or None to use
+            build_pool's limit for the build. POSIX only.
+        failures: A dict of packages that failed to install or
+            uninstall during the last install_packages() and why.
 
     """
 
@@ -81,26 +166,91 @@ class ConfigRep:
     STATE_READ = "READ"
     STATE_LOAD = "LOAD"
     STATE_INSTALLED = "INSTALLED"
+    PLAN_INSTALL = plan.INSTALL
+    PLAN_UPGRADE = plan.UPGRADE
+    PLAN_SKIP = plan.SKIP
 
     @classmethod
-    def install_package(cls, package):
-        """Installs a package.
+    def run_pip(cls, args, **kwargs):
+        """Run pip, retrying with exponential backoff on failure.
 
         Args:
-            package: A str of the package to install.
+            args: A list of arguments for pip, e.g.
+                ``["install", "click"]``.
+            timeout: A number of seconds each attempt may take, or
+                None for no limit.
+            retries: An int of attempts to make after the first
+                fails [0].
+            backoff: A number of seconds to wait before the first
+                retry, doubled for each one after [1.0].
+            cpu_limit: A number of CPU seconds pip may use, or None.
+            memory_limit: An int of bytes of address space pip may
+                use, or None.
+            timings: A list the duration in seconds of each attempt
+                is appended to, or None.
 
         Returns:
-            True on success.
+            None on success OR a str describing the last failure.
 
         """
-        success = subprocess.check_call(
-            [sys.executable, "-m", "pip", "install", package]
+        timeout = kwargs.get("timeout", None)
+        retries = kwargs.get("retries", 0)
+        backoff = kwargs.get("backoff", 1.0)
+        preexec_fn = _limits_preexec(
+            kwargs.get("cpu_limit", None), kwargs.get("memory_limit", None)
         )
+        timings = kwargs.get("timings", None)
+
+        reason = None
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                delay = backoff * 2 ** (attempt - 1)
+                logger.info(
+                    "Retrying pip %s in %ss (%s)", " ".join(args), delay, reason
+                )
+                time.sleep(delay)
+
+            start = time.monotonic()
+            try:
+                sub_return = subprocess.run(
+                    [sys.executable, "-m", "pip"] + list(args),
+                    check=False,
+                    timeout=timeout,
+                    preexec_fn=preexec_fn,
+                )
+            except subprocess.TimeoutExpired:
+                reason = f"timed out after {timeout}s"
+            except OSError as ex:
+                reason = str(ex)
+            else:
+                reason = (
+                    None
+                    if sub_return.returncode == 0
+                    else f"exit status {sub_return.returncode}"
+                )
 
-        if success != 0:
-            return False
+            if timings is not None:
+                timings.append(time.monotonic() - start)
 
-        return True
+            if reason is None:
+                return None
+
+        return reason
+
+    @classmethod
+    def install_package(cls, package, **kwargs):
+        """Installs a package.
+
+        Args:
+            package: A str of the package to install.
+            **kwargs: Timeout, retry and limit options, as for
+                run_pip().
+
+        Returns:
+            True on success.
+
+        """
+        return cls.run_pip(["install", package], **kwargs) is None
 
     @classmethod
     def import_module(cls, module):
@@ -157,9 +307,44 @@ class ConfigRep:
         # suffix for renaming build/dist directories
         self._rename_end = None
 
-    def process_config(self):
-        """Perform all steps with one call."""
-        return self.read_config() and self.load_config() and self.install_packages()
+        # data kept between runs
+        self.cache_dir = kwargs.get(
+            "cache_dir", os.path.join(os.path.expanduser("~"), FILE_DIR)
+        )
+        self._history = plan.InstallHistory(self.cache_dir)
+
+        # where to look for wheels when planning
+        self.wheelhouse = kwargs.get("wheelhouse", None)
+        if isinstance(self.wheelhouse, str):
+            self.wheelhouse = [self.wheelhouse]
+        elif self.wheelhouse is not None:
+            self.wheelhouse = list(self.wheelhouse)
+
+        # warm processes for building wheels, optional
+        self.build_pool = kwargs.get("build_pool", None)
+
+        # previous resolution, for installing only what changed
+        self.lock_file = kwargs.get("lock_file", None)
+
+        # timeouts, retries and limits for subprocesses
+        self.build_timeout = kwargs.get("build_timeout", None)
+        self.install_timeout = kwargs.get("install_timeout", None)
+        self.install_retries = kwargs.get("install_retries", 0)
+        self.retry_backoff = kwargs.get("retry_backoff", 1.0)
+        self.cpu_limit = kwargs.get("cpu_limit", None)
+        self.memory_limit = kwargs.get("memory_limit", None)
+        self.failures = {}
+
+    def process_config(self, **kwargs):
+        """Perform all steps with one call.
+
+        Keyword arguments are passed on to install_packages().
+        """
+        return (
+            self.read_config()
+            and self.load_config()
+            and self.install_packages(**kwargs)
+        )
 
     def _create_wheel(self):
         # if build and/or dist directories already exist, rename
@@ -186,8 +371,27 @@ class ConfigRep:
             "--dist-dir",
             os.path.join(self.setup_path, FILE_DIR, "dist"),
         ]
-        sub_return = subprocess.run(commands, check=False)
-        if sub_return.returncode != 0:
+        try:
+            if self.build_pool is not None:
+                returncode = self.build_pool.build(
+                    os.getcwd(),
+                    commands[1:],
+                    timeout=self.build_timeout,
+                    cpu_limit=self.cpu_limit,
+                    memory_limit=self.memory_limit,
+                )
+            else:
+                returncode = subprocess.run(
+                    commands,
+                    check=False,
+                    timeout=self.build_timeout,
+                    preexec_fn=_limits_preexec(self.cpu_limit, self.memory_limit),
+                ).returncode
+        except subprocess.TimeoutExpired:
+            logger.error("Wheel build timed out after %ss", self.build_timeout)
+            returncode = None
+
+        if returncode != 0:
             logger.error("Pyppyn could not setup package. Wheel build failed!")
             raise ChildProcessError
 
@@ -200,10 +404,34 @@ class ConfigRep:
         for wheel_file in glob.glob(os.path.join(".", "*whl")):
             logger.info("Wheel archive found: %s", wheel_file)
 
+        self.config["entry_points"] = {}
+        self.config["modules"] = []
+
         if wheel_file is not None:
             logger.info("Unzipping: %s", wheel_file)
             with zipfile.ZipFile(wheel_file, "r") as zip_ref:
-                zip_ref.extractall(ConfigRep.WHEEL_TEMP_DIR)
+                # extract and index in the same pass over the archive
+                for info in zip_ref.infolist():
+                    zip_ref.extract(info, ConfigRep.WHEEL_TEMP_DIR)
+
+                    # only the wheel's own, not one vendored further down
+                    if info.filename.count("/") == 1 and info.filename.endswith(
+                        ".dist-info/entry_points.txt"
+                    ):
+                        self.config["entry_points"] = _parse_entry_points(
+                            zip_ref.read(info).decode("utf8")
+                        )
+                        continue
+
+                    module = _module_name(info.filename)
+                    if module is not None:
+                        self.config["modules"].append(
+                            {
+                                "module": module,
+                                "path": info.filename,
+                                "size": info.file_size,
+                            }
+                        )
 
     def _wheel_directories(self):
         # look at directories wheel created
@@ -227,16 +455,9 @@ class ConfigRep:
     def _wheel_console_scripts(self):
         # console scripts
         logger.info("Reading names of console scripts")
-        self.config["console_scripts"] = []
-        console_scripts = False
-        with open("entry_points.txt", "r", encoding="utf8") as ep_file:
-            for line in ep_file:
-                if line.startswith("[console_scripts]"):
-                    console_scripts = True
-                elif console_scripts:
-                    parts = line.split(" = ")
-                    if len(parts) > 1:
-                        self.config["console_scripts"].append(parts[0].strip())
+        self.config["console_scripts"] = list(
+            self.config["entry_points"].get("console_scripts", {})
+        )
 
     def _wheel_metadata(self):
         # metadata
@@ -424,24 +645,185 @@ class ConfigRep:
 
         return self._status["should_load"] > 0
 
-    def install_packages(self):
-        """Install all needed packages from the config file."""
-        if self._status["state"] != ConfigRep.STATE_LOAD:
-            self.load_config()
-
-        for package in (
+    def _install_list(self):
+        """Return the packages install_packages() works through."""
+        return (
             self.reqs["os"]
             + self.reqs["python"]
             + self.reqs["base"]
             + self.reqs["unparsed"]
-        ):
+        )
+
+    def install_packages(self, only_changed=False, uninstall_removed=False):
+        """Install all needed packages from the config file.
+
+        Args:
+            only_changed: Boolean. If True, install only packages
+                added or with changed specifiers since the
+                requirements saved by the last install.
+            uninstall_removed: Boolean. If True, uninstall packages
+                that are no longer required since the last install.
+
+        """
+        if self._status["state"] != ConfigRep.STATE_LOAD:
+            self.load_config()
+
+        packages = self._install_list()
+        pip_options = {
+            "timeout": self.install_timeout,
+            "retries": self.install_retries,
+            "backoff": self.retry_backoff,
+            "cpu_limit": self.cpu_limit,
+            "memory_limit": self.memory_limit,
+        }
+        self.failures = {}
+
+        if only_changed or uninstall_removed:
+            diff = self.diff_requirements()
+
+            if only_changed:
+                packages = diff["added"] + [new for _, new in diff["changed"]]
+                self._status["should_load"] = len(packages)
+
+            if uninstall_removed:
+                for package in diff["removed"]:
+                    logger.info("Uninstalling package: %s", package)
+                    reason = ConfigRep.run_pip(
+                        ["uninstall", "-y", split_requirement(package)[0]],
+                        **pip_options,
+                    )
+                    if reason is not None:
+                        logger.error("Could not uninstall %s: %s", package, reason)
+                        self.failures[package] = reason
+
+        for package in packages:
             logger.info("Installing package: %s", package)
-            if ConfigRep.install_package(package):
+            name = split_requirement(package)[0]
+            before = installed_version(name)
+            timings = []
+            reason = ConfigRep.run_pip(
+                ["install", package], timings=timings, **pip_options
+            )
+            if reason is None:
                 self._status["did_load"] += 1
 
+                # only real installs count, not "already satisfied", and
+                # only the attempt that worked, not failures and backoff
+                if installed_version(name) != before:
+                    self._history.record(package, timings[-1])
+            else:
+                logger.error("Could not install %s: %s", package, reason)
+                self.failures[package] = reason
+
+        self._history.save()
         self._status["state"] = ConfigRep.STATE_INSTALLED
 
-        return self._status["did_load"] == self._status["should_load"]
+        # keep the old lock if anything failed, so it is retried
+        if (
+            not self.failures
+            and self._status["did_load"] == self._status["should_load"]
+        ):
+            self.save_requirements()
+            return True
+
+        return False
+
+    def _lock_path(self):
+        """Return the path of the saved requirements file."""
+        if self.lock_file is not None:
+            return self.lock_file
+
+        return lock.default_lock_file(self.cache_dir, self.config["app_name"])
+
+    def save_requirements(self, lock_file=None):
+        """Save the current requirements for later diffing.
+
+        Args:
+            lock_file: A str of the file to write. Defaults to
+                lock_file given when instantiating, or a file in
+                cache_dir named for the package and the running
+                environment.
+
+        Returns:
+            True on success.
+
+        """
+        return lock.save_requirements(
+            lock_file or self._lock_path(),
+            self.config["app_name"],
+            self.config["app_version"],
+            self._install_list(),
+        )
+
+    def load_requirements(self, lock_file=None):
+        """Return requirements saved by an earlier install.
+
+        Args:
+            lock_file: A str of the file to read. Defaults as in
+                save_requirements().
+
+        Returns:
+            A list of requirement strs, empty if nothing was saved.
+
+        """
+        return lock.load_requirements(lock_file or self._lock_path())
+
+    def diff_requirements(self, previous=None):
+        """Compare current requirements with a previous set.
+
+        Requirements are matched by normalized name. One whose
+        version specifier allows different versions is reported as
+        changed.
+
+        Args:
+            previous: A list of requirement strs, or a str of a
+                file saved by save_requirements(). Defaults to the
+                requirements saved by the last install.
+
+        Returns:
+            A dict with "added" and "removed" lists of requirement
+            strs, and a "changed" list of (old, new) tuples.
+
+        """
+        if (
+            self._status["state"] != ConfigRep.STATE_LOAD
+            and self._status["state"] != ConfigRep.STATE_INSTALLED
+        ):
+            self.load_config()
+
+        if previous is None or isinstance(previous, str):
+            previous = self.load_requirements(previous)
+
+        return lock.diff_requirements(previous, self._install_list())
+
+    def plan_packages(self):
+        """Work out what install_packages() would do, without doing it.
+
+        Each required package is compared against the installed
+        distributions to decide whether it would be installed,
+        upgraded or skipped. Wheel sizes come from the wheelhouse
+        directories and time estimates from the install history
+        recorded by earlier runs. Nothing is installed.
+
+        Returns:
+            A dict with a "packages" list describing each
+            requirement, plus "wheel_bytes" and "estimated_seconds"
+            totals. Packages without history have an estimate of
+            None and are left out of the total.
+
+        """
+        if (
+            self._status["state"] != ConfigRep.STATE_LOAD
+            and self._status["state"] != ConfigRep.STATE_INSTALLED
+        ):
+            self.load_config()
+
+        install_plan = plan.plan_install(
+            self._install_list(), self.wheelhouse, self._history
+        )
+        install_plan["app_name"] = self.config["app_name"]
+
+        return install_plan
 
     def get_required(self, include_extras_require=True):
         """Return required packages based on configuration.
@@ -519,3 +901,56 @@ class ConfigRep:
             self.load_config()
 
         return self.config.get(key, self.config["metadata"].get(key, [None]))
+
+    def get_entry_points(self, group=None):
+        """Return entry points found in the wheel.
+
+        The index is built while the wheel is unzipped, so no files
+        are read again.
+
+        Args:
+            group: A str of an entry point group, such as
+                "console_scripts", or None for all groups.
+
+        Returns:
+            A dict of entry point names to "module:attr" targets for
+            the group, OR a dict of all groups to such dicts.
+
+        """
+        if (
+            self._status["state"] != ConfigRep.STATE_LOAD
+            and self._status["state"] != ConfigRep.STATE_INSTALLED
+        ):
+            self.load_config()
+
+        if group is None:
+            return self.config["entry_points"]
+
+        return self.config["entry_points"].get(group, {})
+
+    def get_modules(self, prefix=None):
+        """Return module files found in the wheel.
+
+        Args:
+            prefix: A str of a dotted module name. Only that module
+                and its submodules are returned. None returns all.
+
+        Returns:
+            A list of dicts with "module", "path" (within the wheel)
+            and "size" (bytes) of each module file.
+
+        """
+        if (
+            self._status["state"] != ConfigRep.STATE_LOAD
+            and self._status["state"] != ConfigRep.STATE_INSTALLED
+        ):
+            self.load_config()
+
+        if prefix is None:
+            return self.config["modules"]
+
+        return [
+            entry
+            for entry in self.config["modules"]
+            if entry["module"] == prefix or entry["module"].startswith(prefix + ".")
+        ]
@@ -9,6 +9,8 @@ from __future__ import (
     with_statement,
 )
 
+import json
+import os
 import sys
 
 import click
@@ -18,6 +20,19 @@ import pyppyn
 click.disable_unicode_literals_warning = True
 
 
+def _stdout_to_stderr():
+    """Send everything written to stdout to stderr instead.
+
+    This covers logging and wheel build output, not just print, so
+    that stdout can carry machine-readable output. Returns a file
+    writing to the original stdout.
+    """
+    sys.stdout.flush()
+    original_stdout = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return original_stdout
+
+
 @click.command(
     context_settings=dict(
         ignore_unknown_options=True,
@@ -55,8 +70,82 @@ click.disable_unicode_literals_warning = True
     help="Display package information but do not install or \
               import packages.",
 )
+@click.option(
+    "--plan",
+    "plan",
+    is_flag=True,
+    help="Print JSON of what would be installed, upgraded or \
+              skipped, with wheel sizes and estimated time, without \
+              installing. Other output goes to stderr.",
+)
+@click.option(
+    "--wheelhouse",
+    "-w",
+    "wheelhouse",
+    multiple=True,
+    help="Directory of local wheels used to size a plan. May be \
+              given more than once.",
+)
+@click.option(
+    "--only-changed",
+    "only_changed",
+    is_flag=True,
+    help="With --auto-load, install only requirements added or \
+              changed since the last install.",
+)
+@click.option(
+    "--uninstall-removed",
+    "uninstall_removed",
+    is_flag=True,
+    help="With --auto-load, uninstall requirements removed since \
+              the last install.",
+)
+@click.option(
+    "--lock-file",
+    "lock_file",
+    default=None,
+    help="File recording the last installed requirements.",
+)
+@click.option(
+    "--build-timeout",
+    "build_timeout",
+    type=float,
+    default=None,
+    help="Seconds the wheel build may take.",
+)
+@click.option(
+    "--install-timeout",
+    "install_timeout",
+    type=float,
+    default=None,
+    help="Seconds each package install attempt may take.",
+)
+@click.option(
+    "--retries",
+    "install_retries",
+    type=int,
+    default=None,
+    help="Times to retry a failed package install, with \
+              exponential backoff.",
+)
+@click.option(
+    "--cpu-limit",
+    "cpu_limit",
+    type=float,
+    default=None,
+    help="CPU seconds the wheel build and each install may use.",
+)
+@click.option(
+    "--memory-limit",
+    "memory_limit",
+    type=int,
+    default=None,
+    help="Bytes of memory the wheel build and each install may use.",
+)
 def main(**kwargs):
     """Entry point for Pyppyn CLI."""
+    plan_out = _stdout_to_stderr() if kwargs.get("plan", False) else None
+
     print("Pyppyn CLI,", pyppyn.__version__)
 
     # Remove unused options
@@ -69,12 +158,24 @@ def main(**kwargs):
     # Create an instance
     pyppyn_instance = pyppyn.ConfigRep(**kwargs)
 
-    if kwargs.get("display", False):
+    if kwargs.get("plan", False):
+        install_plan = pyppyn_instance.plan_packages()
+        sys.stdout.flush()
+        json.dump(install_plan, plan_out, indent=2)
+        plan_out.write("\n")
+        plan_out.close()
+
+    elif kwargs.get("display", False):
         if not (pyppyn_instance.read_config() and pyppyn_instance.load_config()):
             exit_val = 1
 
     elif kwargs.get("auto_load", False):
-        if not pyppyn_instance.process_config():
+        if not pyppyn_instance.process_config(
+            only_changed=kwargs.get("only_changed", False),
+            uninstall_removed=kwargs.get("uninstall_removed", False),
+        ):
+            for package, reason in pyppyn_instance.failures.items():
+                print(f"Failed: {package} ({reason})")
             exit_val = 1
 
     sys.exit(exit_val)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Saved requirement sets.
+
+After a successful install the requirements are saved to a lock file.
+Diffing the next resolution against it shows which requirements were
+added, removed or changed, so only those need to be touched.
+"""
+
+from __future__ import (
+    absolute_import,  # lock.py pylint: disable=duplicate-code
+    division,
+    print_function,
+    unicode_literals,
+    with_statement,
+)
+
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from pyppyn.requirement import normalize_name, same_specifier, split_requirement
+
+LOCK_SUFFIX = ".requirements.json"
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def default_lock_file(cache_dir, app_name):
+    """Return the lock file for a package in the running environment.
+
+    The name includes a hash of sys.prefix and sys.executable, so
+    each virtualenv and interpreter keeps its own lock. What was
+    installed in one says nothing about another.
+    """
+    environment = hashlib.sha256(
+        f"{sys.prefix}\n{sys.executable}".encode("utf8")
+    ).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{app_name}-{environment}{LOCK_SUFFIX}")
+
+
+def save_requirements(lock_file, app_name, app_version, requirements):
+    """Save requirements for later diffing.
+
+    Args:
+        lock_file: A str of the file to write.
+        app_name: A str of the package the requirements belong to.
+        app_version: A str of the package version.
+        requirements: A list of requirement strs.
+
+    Returns:
+        True on success.
+
+    """
+    lock = {
+        "app_name": app_name,
+        "app_version": app_version,
+        "requirements": list(requirements),
+    }
+
+    try:
+        lock_dir = os.path.dirname(lock_file)
+        if lock_dir and not os.path.isdir(lock_dir):
+            os.makedirs(lock_dir)
+
+        with open(lock_file, "w", encoding="utf8") as lock_fh:
+            json.dump(lock, lock_fh, indent=2)
+    except OSError:
+        logger.info("Could not save requirements to %s", lock_file)
+        return False
+
+    return True
+
+
+def load_requirements(lock_file):
+    """Return requirements saved by save_requirements().
+
+    Args:
+        lock_file: A str of the file to read.
+
+    Returns:
+        A list of requirement strs, empty if nothing was saved.
+
+    """
+    if not os.path.isfile(lock_file):
+        logger.info("No saved requirements at %s", lock_file)
+        return []
+
+    try:
+        with open(lock_file, "r", encoding="utf8") as lock_fh:
+            return json.load(lock_fh).get("requirements", [])
+    except (OSError, ValueError):
+        logger.info("Ignoring unreadable requirements: %s", lock_file)
+        return []
+
+
+def _by_name(requirements):
+    """Return requirements keyed by normalized name."""
+    by_name = {}
+    for req in requirements:
+        name, specifier = split_requirement(req)
+        by_name[normalize_name(name)] = (req, specifier)
+    return by_name
+
+
+def diff_requirements(previous, current):
+    """Compare two sets of requirements.
+
+    Requirements are matched by normalized name. One whose version
+    specifier allows different versions is reported as changed.
+
+    Args:
+        previous: A list of requirement strs.
+        current: A list of requirement strs.
+
+    Returns:
+        A dict with "added" and "removed" lists of requirement strs,
+        and a "changed" list of (old, new) tuples.
+
+    """
+    old = _by_name(previous)
+    new = _by_name(current)
+
+    diff = {"added": [], "removed": [], "changed": []}
+    for name, (req, specifier) in new.items():
+        if name not in old:
+            diff["added"].append(req)
+        elif not same_specifier(old[name][1], specifier):
+            diff["changed"].append((old[name][0], req))
+
+    for name, (req, _) in old.items():
+        if name not in new:
+            diff["removed"].append(req)
+
+    logger.info("Requirements added: %s", diff["added"])
+    logger.info("Requirements removed: %s", diff["removed"])
+    logger.info("Requirements changed: %s", diff["changed"])
+
+    return diff
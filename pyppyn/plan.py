@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""Install planning.
+
+Works out what installing a list of requirements would do without
+changing the environment. Wheel sizes come from local wheelhouse
+directories and time estimates from install timings recorded by
+earlier runs.
+"""
+
+from __future__ import (
+    absolute_import,  # plan.py pylint: disable=duplicate-code
+    division,
+    print_function,
+    unicode_literals,
+    with_statement,
+)
+
+import glob
+import json
+import logging
+import os
+import subprocess
+import sys
+
+from packaging.tags import sys_tags
+from packaging.utils import InvalidWheelFilename, parse_wheel_filename
+from packaging.version import InvalidVersion, Version
+
+from pyppyn.requirement import (
+    installed_version,
+    normalize_name,
+    specifier_contains,
+    split_requirement,
+)
+
+INSTALL = "install"
+UPGRADE = "upgrade"
+SKIP = "skip"
+HISTORY_FILE = "history.json"
+HISTORY_LENGTH = 10
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_SUPPORTED_TAGS = []
+
+
+class InstallHistory:
+    """Install timings kept between runs.
+
+    Only the last few timings of each package are kept, and an
+    estimate is their average.
+
+    Attributes:
+        history_file: A str of the JSON file holding the timings.
+
+    """
+
+    def __init__(self, cache_dir):
+        """Instantiate."""
+        self.history_file = os.path.join(cache_dir, HISTORY_FILE)
+        self._timings = None
+
+    def _load(self):
+        """Return timings, reading them on first use."""
+        if self._timings is None:
+            self._timings = {}
+            if os.path.isfile(self.history_file):
+                try:
+                    with open(self.history_file, "r", encoding="utf8") as history_fh:
+                        self._timings = json.load(history_fh)
+                except (OSError, ValueError):
+                    logger.info("Ignoring unreadable history: %s", self.history_file)
+
+        return self._timings
+
+    def save(self):
+        """Write timings, if any were recorded."""
+        if not self._timings:
+            return
+
+        try:
+            history_dir = os.path.dirname(self.history_file)
+            if history_dir and not os.path.isdir(history_dir):
+                os.makedirs(history_dir)
+
+            with open(self.history_file, "w", encoding="utf8") as history_fh:
+                json.dump(self._timings, history_fh, indent=2, sort_keys=True)
+        except OSError:
+            logger.info("Could not save history to %s", self.history_file)
+
+    def record(self, package, seconds):
+        """Remember how long a package took to install."""
+        name = normalize_name(split_requirement(package)[0])
+        timings = self._load().setdefault(name, [])
+        timings.append(round(seconds, 3))
+        del timings[:-HISTORY_LENGTH]
+
+    def estimate(self, name):
+        """Return average recorded install time, or None if unknown."""
+        timings = self._load().get(normalize_name(name))
+        if not timings:
+            return None
+        return sum(timings) / len(timings)
+
+
+def pip_wheel_cache():
+    """Return a list holding pip's wheel cache directory, if any.
+
+    pip is asked for its cache location, since it differs between
+    platforms and can be configured. Returns an empty list when
+    pip's cache is disabled or cannot be found.
+    """
+    try:
+        sub_return = subprocess.run(
+            [sys.executable, "-m", "pip", "cache", "dir"],
+            check=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return []
+
+    cache_dir = sub_return.stdout.decode("utf8").strip()
+    if sub_return.returncode != 0 or not cache_dir:
+        logger.info("pip cache not available, no wheelhouse searched")
+        return []
+
+    return [os.path.join(cache_dir, "wheels")]
+
+
+def _wheel_info(path):
+    """Return (name, version, tags) of a wheel file, or None."""
+    try:
+        name, version, _, tags = parse_wheel_filename(os.path.basename(path))
+    except (InvalidWheelFilename, InvalidVersion):
+        return None
+    return normalize_name(name), version, tags
+
+
+def wheel_index(wheelhouse):
+    """Return wheels found in directories, keyed by normalized name.
+
+    Args:
+        wheelhouse: A list of directories, searched recursively.
+
+    Returns:
+        A dict of names to lists of (path, Version, tags) tuples.
+
+    """
+    index = {}
+    for wheel_dir in wheelhouse:
+        for wheel_file in glob.glob(
+            os.path.join(wheel_dir, "**", "*.whl"), recursive=True
+        ):
+            info = _wheel_info(wheel_file)
+            if info is not None:
+                index.setdefault(info[0], []).append((wheel_file,) + info[1:])
+
+    return index
+
+
+def _supported(tags):
+    """Return whether any of a wheel's tags work on this platform."""
+    if not _SUPPORTED_TAGS:
+        _SUPPORTED_TAGS.append(frozenset(sys_tags()))
+
+    return not _SUPPORTED_TAGS[0].isdisjoint(tags)
+
+
+def _is_version(version, other):
+    """Return whether a Version equals a version str."""
+    try:
+        return other is not None and version == Version(other)
+    except InvalidVersion:
+        return False
+
+
+def pick_wheel(wheels, specifier="", installed=None):
+    """Return the wheel an install would most likely use, or None.
+
+    A wheel must satisfy the specifier, be a different version from
+    the one installed and support this platform. Of those, the
+    highest version wins.
+
+    Args:
+        wheels: A list of (path, Version, tags) tuples from
+            wheel_index().
+        specifier: A str of the requirement's version specifier.
+        installed: A str of the installed version, or None.
+
+    Returns:
+        A str of the wheel path OR None.
+
+    """
+    candidates = [
+        (path, version)
+        for path, version, tags in wheels
+        if not _is_version(version, installed)
+        and specifier_contains(specifier, str(version))
+        and _supported(tags)
+    ]
+
+    if not candidates:
+        return None
+
+    return max(candidates, key=lambda wheel: wheel[1])[0]
+
+
+def plan_install(packages, wheelhouse=None, history=None):
+    """Work out what installing packages would do, without doing it.
+
+    Each package is compared against the installed distributions to
+    decide whether it would be installed, upgraded or skipped.
+
+    Args:
+        packages: A list of requirement strs.
+        wheelhouse: A list of directories searched for wheels to size
+            installs and upgrades, or None for pip's wheel cache.
+        history: An InstallHistory used for time estimates, or None.
+
+    Returns:
+        A dict with a "packages" list describing each requirement,
+        plus "wheel_bytes" and "estimated_seconds" totals. Packages
+        without history have an estimate of None and are left out of
+        the total.
+
+    """
+    if wheelhouse is None:
+        wheelhouse = pip_wheel_cache()
+
+    wheels = wheel_index(wheelhouse)
+    plan = {"packages": [], "wheel_bytes": 0, "estimated_seconds": 0.0}
+
+    for package in packages:
+        name, specifier = split_requirement(package)
+        normal_name = normalize_name(name)
+        installed = installed_version(name)
+
+        if installed is None:
+            action = INSTALL
+        elif specifier_contains(specifier, installed):
+            action = SKIP
+        else:
+            action = UPGRADE
+
+        entry = {
+            "requirement": package,
+            "name": normal_name,
+            "specifier": specifier,
+            "installed": installed,
+            "action": action,
+            "wheel": None,
+            "wheel_size": None,
+            "estimated_seconds": 0.0,
+        }
+
+        if action != SKIP:
+            entry["wheel"] = pick_wheel(
+                wheels.get(normal_name, []), specifier, installed
+            )
+            if entry["wheel"] is not None:
+                entry["wheel_size"] = os.path.getsize(entry["wheel"])
+                plan["wheel_bytes"] += entry["wheel_size"]
+
+            entry["estimated_seconds"] = (
+                history.estimate(normal_name) if history is not None else None
+            )
+            if entry["estimated_seconds"] is not None:
+                plan["estimated_seconds"] += entry["estimated_seconds"]
+
+        logger.info("Plan: %s %s", action, package)
+        plan["packages"].append(entry)
+
+    return plan
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""Pool of warm processes for building wheels.
+
+Starting ``python setup.py bdist_wheel`` in a new process imports
+setuptools and wheel again every time. When building many packages,
+that fixed startup cost adds up. The workers in this pool import
+setuptools once and then run ``setup.py`` in-process for each build,
+sending the result back over a pipe.
+
+Example:
+    Share a pool between several ``ConfigRep`` instances::
+
+        with WheelBuilderPool(size=2) as pool:
+            for path in paths:
+                ConfigRep(setup_path=path, build_pool=pool).read_config()
+"""
+
+from __future__ import (
+    absolute_import,  # pool.py pylint: disable=duplicate-code
+    division,
+    print_function,
+    unicode_literals,
+    with_statement,
+)
+
+import importlib
+import logging
+import math
+import multiprocessing
+import os
+import runpy
+import subprocess
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# distutils modules that remember directories they have created
+_DIR_UTIL_MODULES = ("distutils.dir_util", "setuptools._distutils.dir_util")
+
+
+def set_resource_limits(cpu_limit=None, memory_limit=None):
+    """Limit CPU time and memory of the current process.
+
+    The CPU limit is counted from now, so it can be applied again
+    before each job in a long-lived process. Does nothing where the
+    resource module is not available.
+
+    Args:
+        cpu_limit: A number of CPU seconds, or None for no limit.
+        memory_limit: An int of bytes of address space, or None for
+            no limit.
+
+    """
+    if resource is None:
+        return
+
+    limits = []
+    if cpu_limit is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        limits.append(
+            (
+                resource.RLIMIT_CPU,
+                int(math.ceil(usage.ru_utime + usage.ru_stime + cpu_limit)),
+            )
+        )
+
+    if memory_limit is not None:
+        limits.append((resource.RLIMIT_AS, int(memory_limit)))
+
+    for limit, soft in limits:
+        hard = resource.getrlimit(limit)[1]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(limit, (soft, hard))
+
+
+def _max_rss():
+    """Return peak resident memory of this process in KiB, or None."""
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # macOS reports bytes rather than kilobytes
+        max_rss //= 1024
+    return max_rss
+
+
+def _reset_build_state():
+    """Clear state distutils keeps between setup() calls.
+
+    mkpath() skips directories it believes it already created, so
+    after a build directory is removed, a second build of the same
+    path in this process would fail to recreate it.
+    """
+    for name in _DIR_UTIL_MODULES:
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, "_path_created"):
+            module._path_created.clear()  # pylint: disable=protected-access
+
+
+def _run_setup(cwd, argv):
+    """Run a setup script in this process and return its exit code.
+
+    Process state touched by the script (working directory, argv,
+    sys.path) is restored afterwards, and modules imported from the
+    package being built are dropped so a later build of another
+    version does not see them.
+    """
+    saved_cwd = os.getcwd()
+    saved_argv = sys.argv
+    saved_path = list(sys.path)
+    cwd = os.path.abspath(cwd)
+
+    _reset_build_state()
+
+    returncode = 0
+    try:
+        os.chdir(cwd)
+        sys.argv = list(argv)
+        sys.path.insert(0, cwd)
+        runpy.run_path(argv[0], run_name="__main__")
+    except SystemExit as ex:
+        if isinstance(ex.code, int):
+            returncode = ex.code
+        elif ex.code is not None:
+            returncode = 1
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Build of %s raised an error", cwd)
+        returncode = 1
+    finally:
+        os.chdir(saved_cwd)
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+        for name, module in list(sys.modules.items()):
+            module_file = getattr(module, "__file__", None) or ""
+            if os.path.abspath(module_file).startswith(cwd + os.sep):
+                del sys.modules[name]
+
+    return returncode
+
+
+def _current_limits():
+    """Return the current CPU and memory rlimits, or None."""
+    if resource is None:
+        return None
+    return [
+        (limit, resource.getrlimit(limit))
+        for limit in (resource.RLIMIT_CPU, resource.RLIMIT_AS)
+    ]
+
+
+def _restore_limits(limits):
+    """Put back rlimits saved by _current_limits()."""
+    for limit, values in limits or []:
+        resource.setrlimit(limit, values)
+
+
+def _build_worker(conn, cpu_limit=None, memory_limit=None):
+    """Serve build requests received over a pipe until told to stop."""
+    set_resource_limits(memory_limit=memory_limit)
+
+    # preload what every build needs
+    # pylint: disable=import-outside-toplevel,unused-import
+    import setuptools  # noqa: F401
+
+    for module in ("setuptools.command.bdist_wheel", "wheel.bdist_wheel"):
+        try:
+            importlib.import_module(module)
+            break
+        except ImportError:
+            pass
+
+    worker_limits = _current_limits()
+    conn.send(_max_rss())
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+
+        if job is None:
+            break
+
+        cwd, argv, job_cpu_limit, job_memory_limit = job
+        set_resource_limits(
+            cpu_limit=cpu_limit if job_cpu_limit is None else job_cpu_limit,
+            memory_limit=job_memory_limit,
+        )
+        returncode = _run_setup(cwd, argv)
+        _restore_limits(worker_limits)
+        conn.send((returncode, _max_rss()))
+
+    conn.close()
+
+
+class _Worker:
+    """A single warm build process and its bookkeeping."""
+
+    def __init__(self, context, cpu_limit=None, memory_limit=None):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_build_worker,
+            args=(child_conn, cpu_limit, memory_limit),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.builds = 0
+
+        try:
+            self.base_rss = self.conn.recv()
+        except EOFError:
+            # died during startup, e.g. memory_limit too low
+            self.process.join()
+            self.conn.close()
+            raise
+
+        self.rss = self.base_rss
+
+    def stop(self):
+        """Ask the process to exit, killing it if it does not."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class WheelBuilderPool:
+    """Reusable processes for running setup.py builds.
+
+    Workers are started as needed, up to ``size``, and each is
+    replaced after ``max_builds`` builds or once its peak memory has
+    grown by more than ``max_memory_growth`` since it started. The
+    pool is thread-safe, so one pool can serve builds from several
+    threads.
+
+    Attributes:
+        size: An int of the most workers to run at once.
+        max_builds: An int of builds a worker runs before it is
+            replaced.
+        max_memory_growth: An int of KiB of peak memory growth after
+            which a worker is replaced, or None for no limit. Memory
+            is only checked where the resource module exists.
+        cpu_limit: A number of CPU seconds allowed per build, or None.
+            A worker that goes over is killed and the build fails.
+        memory_limit: An int of bytes of address space allowed per
+            worker, or None.
+
+    Limits given to build() apply to that build only, in place of
+    the pool's.
+
+    """
+
+    def __init__(self, size=1, max_builds=50, max_memory_growth=None, **kwargs):
+        """Instantiate."""
+        self.size = size
+        self.max_builds = max_builds
+        self.max_memory_growth = max_memory_growth
+        self.cpu_limit = kwargs.get("cpu_limit", None)
+        self.memory_limit = kwargs.get("memory_limit", None)
+
+        self._context = multiprocessing.get_context()
+        self._idle = []
+        self._workers = []
+        self._starting = 0
+        self._available = threading.Condition()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _acquire(self):
+        """Return an idle worker, starting one if there is room."""
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("WheelBuilderPool is closed")
+
+                if self._idle:
+                    return self._idle.pop()
+
+                if len(self._workers) + self._starting < self.size:
+                    # hold a slot while starting, without the lock
+                    self._starting += 1
+                    break
+
+                self._available.wait()
+
+        worker = None
+        try:
+            worker = _Worker(self._context, self.cpu_limit, self.memory_limit)
+        finally:
+            with self._available:
+                self._starting -= 1
+                closed = self._closed
+                if worker is not None and not closed:
+                    self._workers.append(worker)
+                self._available.notify()
+
+        if closed:
+            worker.stop()
+            raise RuntimeError("WheelBuilderPool is closed")
+
+        logger.info("Started build worker (pid %s)", worker.process.pid)
+        return worker
+
+    def _release(self, worker):
+        """Make a worker available for the next build."""
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _retire(self, worker):
+        """Stop a worker and make room for a new one."""
+        with self._available:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self._available.notify()
+        worker.stop()
+
+    def _worn_out(self, worker):
+        if worker.builds >= self.max_builds:
+            return True
+
+        return (
+            self.max_memory_growth is not None
+            and worker.rss is not None
+            and worker.rss - worker.base_rss > self.max_memory_growth
+        )
+
+    def build(self, cwd, argv, timeout=None, **kwargs):
+        """Run a setup script in a warm worker.
+
+        Args:
+            cwd: A str of the directory to run the script in.
+            argv: A list of the script and its arguments, e.g.
+                ``["setup.py", "bdist_wheel"]``.
+            timeout: A number of seconds to wait for the build, or
+                None to wait indefinitely.
+            cpu_limit: A number of CPU seconds for this build, or
+                None to use the pool's.
+            memory_limit: An int of bytes of address space for this
+                build, or None to use the pool's.
+
+        Returns:
+            An int exit code, 0 on success.
+
+        Raises:
+            subprocess.TimeoutExpired: The build took longer than
+                timeout. The worker running it is killed.
+
+        """
+        try:
+            worker = self._acquire()
+        except (EOFError, OSError):
+            logger.error("Build worker failed to start")
+            return 1
+
+        try:
+            worker.conn.send(
+                (
+                    cwd,
+                    list(argv),
+                    kwargs.get("cpu_limit", None),
+                    kwargs.get("memory_limit", None),
+                )
+            )
+            if not worker.conn.poll(timeout):
+                logger.error(
+                    "Build worker (pid %s) timed out after %ss",
+                    worker.process.pid,
+                    timeout,
+                )
+                worker.process.kill()
+                self._retire(worker)
+                raise subprocess.TimeoutExpired(argv, timeout)
+
+            returncode, worker.rss = worker.conn.recv()
+        except (EOFError, OSError):
+            logger.error("Build worker (pid %s) died", worker.process.pid)
+            self._retire(worker)
+            return 1
+
+        worker.builds += 1
+        if self._worn_out(worker):
+            logger.info(
+                "Recycling build worker (pid %s) after %s builds",
+                worker.process.pid,
+                worker.builds,
+            )
+            self._retire(worker)
+        else:
+            self._release(worker)
+
+        return returncode
+
+    def close(self):
+        """Stop all workers."""
+        with self._available:
+            self._closed = True
+            workers = self._workers
+            self._workers = []
+            self._idle = []
+            self._available.notify_all()
+
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Helpers for requirement strings and installed distributions."""
+
+from __future__ import (
+    absolute_import,  # requirement.py pylint: disable=duplicate-code
+    division,
+    print_function,
+    unicode_literals,
+    with_statement,
+)
+
+import re
+
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:  # python < 3.8
+    import importlib_metadata
+
+from packaging.specifiers import SpecifierSet
+
+
+def normalize_name(name):
+    """Normalize a project name for comparisons (PEP 503)."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def split_requirement(req):
+    """Split a requirement into its name and version specifier.
+
+    Handles both ``name>=1.0`` and the older ``name (>=1.0)`` forms
+    found in wheel metadata. Extras are dropped.
+    """
+    match = re.match(
+        r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*\(?([^)]*)\)?\s*$",
+        req,
+    )
+    if match is None:
+        return req.strip(), ""
+    return match.group(1), match.group(3).strip()
+
+
+def installed_version(name):
+    """Return the installed version of a distribution.
+
+    Args:
+        name: A str of the distribution name.
+
+    Returns:
+        A str of the version OR None if it is not installed.
+
+    """
+    try:
+        return importlib_metadata.version(name)
+    except importlib_metadata.PackageNotFoundError:
+        return None
+
+
+def specifier_contains(specifier, version):
+    """Return whether a version satisfies a specifier.
+
+    Args:
+        specifier: A str of a version specifier, e.g. ">=1.0,<2".
+            An empty specifier allows any version.
+        version: A str of the version to check.
+
+    Returns:
+        True if it does.
+
+    """
+    if not specifier:
+        return True
+
+    try:
+        return version in SpecifierSet(specifier)
+    except ValueError:
+        # invalid specifier or version
+        return False
+
+
+def same_specifier(first, second):
+    """Return whether two version specifiers are equivalent.
+
+    The order of clauses does not matter (">=1,<2" equals "<2,>=1").
+    Invalid specifiers are compared as strings, ignoring whitespace.
+    """
+    try:
+        return SpecifierSet(first) == SpecifierSet(second)
+    except ValueError:
+        return first.replace(" ", "") == second.replace(" ", "")
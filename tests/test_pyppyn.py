@@ -9,11 +9,22 @@ from __future__ import (
     with_statement,
 )
 
+import json
+import os
 import platform
+import subprocess
+import sys
 
 import pytest
 
-from pyppyn import ConfigRep
+from pyppyn import ConfigRep, WheelBuilderPool, _module_name
+from pyppyn.lock import (
+    default_lock_file,
+    diff_requirements,
+    load_requirements,
+    save_requirements,
+)
+from pyppyn.plan import InstallHistory, pip_wheel_cache, plan_install
 
 
 @pytest.fixture
@@ -114,3 +125,179 @@ def test_get_config_attr(configrep):
 def test_get_config_list(configrep):
     """Test getting a list from the configuration."""
     assert set(configrep.get_config_list("platform")) == set(["Linux", "Windows"])
+
+
+def test_plan_cli(tmp_path):
+    """Test that --plan prints only the plan JSON on stdout."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from pyppyn.cli import main; main()",
+            "--plan",
+            "--setup-path",
+            "tests/minipippy",
+            "--wheelhouse",
+            str(tmp_path),
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    plan = json.loads(result.stdout.decode("utf8"))
+    assert plan["app_name"] == "minipippy"
+    assert set(entry["name"] for entry in plan["packages"]) >= set(
+        ["backoff", "click", "pyyaml"]
+    )
+
+
+def test_plan_install(tmp_path):
+    """Test sizing and timing a plan from a wheelhouse and history."""
+    wheelhouse = tmp_path / "wheelhouse"
+    wheelhouse.mkdir()
+    for wheel, size in (
+        ("not_installed_pkg-0.9-py3-none-any.whl", 10),
+        ("not_installed_pkg-1.2-py3-none-any.whl", 100),
+        ("not_installed_pkg-1.5-cp27-cp27m-win32.whl", 1000),
+    ):
+        (wheelhouse / wheel).write_bytes(b"x" * size)
+    (tmp_path / "history.json").write_text(
+        json.dumps({"not-installed-pkg": [2.0, 4.0]}), encoding="utf8"
+    )
+
+    install_plan = plan_install(
+        ["not.installed.pkg>=1.0", "pytest"],
+        [str(wheelhouse)],
+        InstallHistory(str(tmp_path)),
+    )
+    entry = install_plan["packages"][0]
+    assert entry["action"] == ConfigRep.PLAN_INSTALL
+    assert entry["wheel"].endswith("not_installed_pkg-1.2-py3-none-any.whl")
+    assert entry["wheel_size"] == 100
+    assert entry["estimated_seconds"] == 3.0
+    assert install_plan["packages"][1]["action"] == ConfigRep.PLAN_SKIP
+    assert install_plan["wheel_bytes"] == 100
+    assert install_plan["estimated_seconds"] == 3.0
+
+
+def test_pip_wheel_cache():
+    """Test asking pip where its wheel cache is."""
+    for wheel_dir in pip_wheel_cache():
+        assert os.path.basename(wheel_dir) == "wheels"
+
+
+def test_wheel_builder_pool():
+    """Test building the same package more than once in a warm worker."""
+    setup_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "minipippy")
+    with WheelBuilderPool(max_builds=3) as pool:
+        for _ in range(3):
+            configrep = ConfigRep(setup_path=setup_path, build_pool=pool)
+            assert configrep.read_config()
+            assert configrep.config["metadata"]["name"] == ["minipippy"]
+            assert configrep.config["metadata"]["version"] == ["4.8.2"]
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="memory limit enforced on Linux"
+)
+def test_pool_startup_failure():
+    """Test that a worker failing to start fails the build."""
+    with WheelBuilderPool(memory_limit=1) as pool:
+        assert pool.build(".", ["setup.py", "--name"]) != 0
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="memory limit enforced on Linux"
+)
+def test_pool_build_limits(tmp_path):
+    """Test that limits given to a build apply to that build only."""
+    (tmp_path / "size.py").write_text(
+        "import os\n"
+        "with open('/proc/self/statm') as statm:\n"
+        "    pages = int(statm.read().split()[0])\n"
+        "with open('size.txt', 'w') as size:\n"
+        "    size.write(str(pages * os.sysconf('SC_PAGE_SIZE')))\n"
+    )
+    (tmp_path / "big.py").write_text("x = bytearray(64 * 1024 ** 2)\n")
+
+    with WheelBuilderPool() as pool:
+        assert pool.build(str(tmp_path), ["size.py"]) == 0
+        limit = int((tmp_path / "size.txt").read_text()) + 32 * 1024**2
+
+        assert pool.build(str(tmp_path), ["big.py"], memory_limit=limit) != 0
+        assert pool.build(str(tmp_path), ["big.py"]) == 0
+
+
+def test_diff_requirements(configrep):
+    """Test diffing requirements against a previous set."""
+    diff = configrep.diff_requirements(["click>=1.0", "oldpackage", "backoff"])
+    assert "pyyaml" in diff["added"]
+    assert diff["removed"] == ["oldpackage"]
+    assert diff["changed"] == [("click>=1.0", "click")]
+
+
+def test_diff_specifiers():
+    """Test that only specifiers allowing other versions count as changed."""
+    diff = diff_requirements(["a>=1,<2", "b", "c (>=1)"], ["a<2,>=1", "b>=2", "c>=1"])
+    assert diff == {"added": [], "removed": [], "changed": [("b", "b>=2")]}
+
+
+def test_uninstall_failure(tmp_path, monkeypatch):
+    """Test that a failed uninstall is recorded and the lock is kept."""
+    lock_file = str(tmp_path / "lock.json")
+    save_requirements(lock_file, "minipippy", "4.8.2", ["backoff", "oldpackage"])
+    monkeypatch.setattr(
+        ConfigRep,
+        "run_pip",
+        classmethod(lambda cls, args, **kwargs: "failed" if "-y" in args else None),
+    )
+
+    configrep = ConfigRep(setup_path="tests/minipippy", lock_file=lock_file)
+    assert not configrep.process_config(only_changed=True, uninstall_removed=True)
+    assert configrep.failures == {"oldpackage": "failed"}
+    assert "oldpackage" in load_requirements(lock_file)
+
+
+def test_lock_per_environment(tmp_path, monkeypatch):
+    """Test that different environments do not share a lock."""
+    monkeypatch.setattr(sys, "prefix", "/venv/a")
+    lock_a = default_lock_file(str(tmp_path), "minipippy")
+    monkeypatch.setattr(sys, "prefix", "/venv/b")
+    lock_b = default_lock_file(str(tmp_path), "minipippy")
+    assert lock_a != lock_b
+
+    save_requirements(lock_a, "minipippy", "4.8.2", ["backoff"])
+    assert load_requirements(lock_b) == []
+
+
+def test_run_pip_timeout():
+    """Test that a pip run past its timeout is reported, not raised."""
+    timings = []
+    reason = ConfigRep.run_pip(
+        ["--version"], timeout=0.001, retries=1, backoff=0, timings=timings
+    )
+    assert reason.startswith("timed out")
+    assert len(timings) == 2
+
+
+def test_get_entry_points(configrep):
+    """Test the entry point index built from the wheel."""
+    assert configrep.get_entry_points("console_scripts") == {
+        "minipippy": "minipippy.__init__:main"
+    }
+    assert configrep.get_config_list("console_scripts") == ["minipippy"]
+
+
+def test_get_modules(configrep):
+    """Test the module manifest built from the wheel."""
+    modules = configrep.get_modules("minipippy")
+    assert [entry["module"] for entry in modules] == ["minipippy"]
+    assert modules[0]["path"] == "minipippy/__init__.py"
+    assert modules[0]["size"] > 0
+
+
+def test_module_names():
+    """Test module names of files found in wheels."""
+    assert _module_name("pkg/__pycache__/mod.cpython-311.pyc") == "pkg.mod"
+    assert _module_name("pkg/_ext.cpython-311-x86_64-linux-gnu.so") == "pkg._ext"
+    assert _module_name("pkg-1.0.data/purelib/extra/__init__.py") == "extra"
+    assert _module_name("pkg-1.0.dist-info/RECORD") is None